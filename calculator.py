@@ -1,5 +1,64 @@
-import string
-import collections
+import sys
+import functools
+import operator
+import re
+
+TOKENS = re.compile(r"""
+    (?P<integer>[0-9]+)
+    |(?P<variable>[A-Za-z]+)
+    |(?P<sign>[-+](?=[0-9A-Za-z(]))
+    |(?P<signs>\++|-+)
+    |(?P<doubled>\*\*|//|\^\^)
+    |(?P<muldiv>[*/])
+    |(?P<power>\^)
+    |(?P<left>\()
+    |(?P<right>\))
+    |(?P<invalid>.)
+""", re.VERBOSE | re.DOTALL)
+INTEGER, VARIABLE, OPERATOR = range(3)  # tags of tokens in reverse Polish notation
+ADD_POPPED = frozenset("+-*/^#")  # stack operators popped before + or -
+MUL_POPPED = frozenset("*/^#")  # stack operators popped before * or /
+POW_POPPED = frozenset("#")  # stack operators popped before ^, which is right-associative
+# all characters str.split() treats as whitespace, the last of them being U+3000
+WHITESPACE_REMOVAL = dict.fromkeys(code for code in range(0x3001) if chr(code).isspace())
+POWER_BITS_LIMIT = 1_000_000  # maximum size of integer power result
+SEEN_EXPRESSIONS_LIMIT = 4096  # number of expressions remembered as seen
+RESULTS_CACHE_SIZE = 256  # number of cached results of expressions with powers
+RESULT_BITS_LIMIT = 65536  # maximum size of cached integer result
+FOLDED_BITS_LIMIT = 64  # maximum size of integer computed when compiling expression
+OPERATOR_SOURCE = {  # Python source templates of binary operators
+    "+": "%s + %s",
+    "-": "%s - %s",
+    "*": "%s * %s",
+    "/": "%s // %s",
+    "^": "power(%s, %s)",
+}
+
+
+def power(base, exponent):
+    """ Raise base to exponent.
+
+    If integer result could be longer than POWER_BITS_LIMIT bits, raise OverflowError
+    instead of spending time and memory on it. Bases 0, 1 and -1 are never refused.
+    """
+
+    if exponent > 0 and isinstance(base, int) and isinstance(exponent, int) and abs(base) > 1:
+        if abs(base).bit_length() * exponent > POWER_BITS_LIMIT:
+            raise OverflowError("power result too large")
+    return base ** exponent
+
+
+BINARY_OPERATIONS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.floordiv,
+    "^": power,
+}
+
+
+seen_expressions = set()  # expressions evaluated at least once
+results = {}  # results of expressions with powers by expression and values of variables
 
 
 def parse_command(line):
@@ -16,7 +75,7 @@ def parse_command(line):
         print("Unknown command")
 
 
-def parse_assignment(line):
+def parse_assignment(line, variables):
     """ Assign value of expression on the right to variable on the left.
 
     Split assignment into two parts, evaluate right part and assign to variable in left part.
@@ -26,217 +85,322 @@ def parse_assignment(line):
     If unknown variable in right part, throw Unknown variable error.
     """
 
-    line = line.split("=", 1)
-    if not line[0]:
+    name, _, expression = line.partition("=")
+    if not name:
         print("Invalid expression")
-    elif not line[0].isalpha():
+    elif not name.isalpha():
         print("Invalid identifier")
     else:
-        if not line[1]:
+        if not expression:
             print("Invalid assignment")
-        elif line[1].isalpha() and line[1] not in variables:
-            print("Unknown variable")
         else:
-            result = parse_expression(line[1])
-            if result in ("Invalid expression", "Unknown variable"):
+            result = parse_expression(expression, variables)
+            if expression.isalpha() and result in ("Invalid expression", "Unknown variable"):
+                print("Unknown variable")
+            elif result in ("Invalid expression", "Unknown variable"):
                 print("Invalid assignment")
             else:
-                variables[line[0]] = result
+                variables[name] = result
 
 
-def parse_expression(infix):
+def parse_expression(infix, variables):
     """ Turn infix notation into reverse Polish notation, then evaluate.
 
     If infix notation results in error, throw Invalid expression error.
+    Interpret expression seen for the first time, compile it only when it comes back.
+    Results of expressions with powers are cached by expression and values of variables
+    used in it, unless some of those values are not integers or result is too large.
     """
 
     rpn_list = infix_to_rpn(infix)
     if rpn_list == "Error":
         return "Invalid expression"
-    result = rpn_to_result(rpn_list)
+    if infix not in seen_expressions:
+        if len(seen_expressions) >= SEEN_EXPRESSIONS_LIMIT:
+            seen_expressions.clear()
+        seen_expressions.add(infix)
+        return rpn_to_result(rpn_list, variables)
+
+    program, names, has_power = compile_expression(infix)
+    if not has_power:
+        return program(variables)
+    values = tuple(variables.get(name) for name in names)
+    if not all(type(value) is int for value in values):
+        return program(variables)
+    key = (infix, values)
+    if key in results:
+        return results[key]
+    result = program(variables)
+    if type(result) is not int or result.bit_length() <= RESULT_BITS_LIMIT:
+        if len(results) >= RESULTS_CACHE_SIZE:
+            results.clear()
+        results[key] = result
     return result
 
 
+@functools.lru_cache(maxsize=4096)
 def infix_to_rpn(infix):
     """ Turn expression in infix notation into reverse Polish notation.
 
-    Each cycle, first check for single unary operator, then for integers and variables,
-    then for operators and parentheses. Append integers and variables to result list.
-    Push operators and parentheses onto stack and pop to result list according to precedence.
+    Result depends only on the infix string, so it is cached and returned as a tuple
+    of (tag, value) pairs, tagged as INTEGER, VARIABLE or OPERATOR.
+
+    Split infix into tokens with a single regular expression: integers, variables,
+    single signs followed by operands, other runs of pluses or minuses, operators
+    and parentheses, so each character is classified once. Plus or minus is unary
+    at the beginning, after operators or after opening parenthesis, binary otherwise.
+    Append integers and variables to result list. Push operators and parentheses
+    onto stack and pop to result list according to precedence.
 
     If unary operator is last or is not followed by integer or variable, throw error.
     If anything besides digits, Latin letters or operators/parenthesis is used, throw error.
     If several multiplication, division or power signs are used in a row, throw error.
+    If integer is too long for int() under current interpreter limits, throw error.
     If closing parenthesis encountered while stack is empty, throw error.
     If opening parenthesis remaining in stack, throw error.
     """
 
     result = []
-    stack = collections.deque()
-    i = 0
-
-    while i < len(infix):
-
-        # Check for unary + or - at the beginning, after operators or opening parenthesis
-        # Make sure that integer or variable follows unary operator
-        if infix[i] in "+-" and (i == 0 or infix[i - 1] in "^*/+-("):
-            if i == len(infix) - 1 or (infix[i + 1] not in string.digits
-                                       and infix[i + 1] not in string.ascii_letters
-                                       and infix[i + 1] != "("):
+    stack = []
+    result_append = result.append
+    stack_append = stack.append
+    stack_pop = stack.pop
+    operand_expected = True  # at the beginning, after operators or opening parenthesis
+
+    for match in TOKENS.finditer(infix):
+        kind = match.lastgroup
+        token = match.group()
+
+        # Append integer or variable to result
+        if kind == "integer":
+            try:
+                result_append((INTEGER, int(token)))
+            except ValueError:  # longer than sys.get_int_max_str_digits() allows
                 return "Error"
-            if infix[i] == "-":
-                stack.append("#")
-            i += 1
-
-        # Check for integer or variable
-        if i < len(infix) and (infix[i] in string.digits or infix[i] in string.ascii_letters):
-
-            # Find end of integer and append it to result, reset sign to positive
-            if infix[i] in string.digits:
-                integer = 0
-                while i < len(infix) and infix[i] in string.digits:
-                    integer = integer * 10 + int(infix[i])
-                    i += 1
-                result.append(integer)
-
-            # Find end of variable name and append it to result
+            operand_expected = False
+        elif kind == "variable":
+            result_append((VARIABLE, token))
+            operand_expected = False
+
+        # Check for unary + or - and make sure that it is a single sign followed by
+        # integer, variable or parenthesis, otherwise resolve addition or subtraction
+        # operator, depending on number of minuses
+        elif kind == "sign" or kind == "signs":
+            if operand_expected:
+                if kind == "signs":
+                    return "Error"
+                if token == "-":
+                    stack_append("#")
             else:
-                var_name = ""
-                while i < len(infix) and infix[i] in string.ascii_letters:
-                    var_name += infix[i]
-                    i += 1
-                result.append(var_name)
-
-        # Check for unacceptable symbols
-        elif i < len(infix) and infix[i] not in "+-*/^()":
-            return "Error"
-
-        # Check for operator or parentheses
-        if i < len(infix) and infix[i] in "+-*/^()":
-
-            # Push left parenthesis onto stack
-            if infix[i] == "(":
-                stack.append("(")
-                i += 1
-
-            # Resolve addition operator, ignore multiple pluses
-            elif infix[i] == "+":
-                while stack and stack[-1] in "+-*/^#":
-                    result.append(stack.pop())
-                stack.append("+")
-                while i < len(infix) and infix[i] == "+":
-                    i += 1
-
-            # Resolve subtraction operator, depending on number of minuses
-            elif infix[i] == "-":
-                while stack and stack[-1] in "+-*/^#":
-                    result.append(stack.pop())
-                minuses = 0
-                while i < len(infix) and infix[i] == "-":
-                    minuses += 1
-                    i += 1
-                if minuses % 2:
-                    stack.append("-")
+                while stack and stack[-1] in ADD_POPPED:
+                    result_append((OPERATOR, stack_pop()))
+                if token[0] == "-" and len(token) % 2:
+                    stack_append("-")
                 else:
-                    stack.append("+")
+                    stack_append("+")
+                operand_expected = True
+
+        # Resolve multiplication or division operator
+        elif kind == "muldiv":
+            while stack and stack[-1] in MUL_POPPED:
+                result_append((OPERATOR, stack_pop()))
+            stack_append(token)
+            operand_expected = True
+
+        # Resolve power operator
+        elif kind == "power":
+            while stack and stack[-1] in POW_POPPED:
+                result_append((OPERATOR, stack_pop()))
+            stack_append(token)
+            operand_expected = True
+
+        # Push left parenthesis onto stack
+        elif kind == "left":
+            stack_append("(")
+            operand_expected = True
+
+        # Resolve right parenthesis
+        elif kind == "right":
+            while stack and stack[-1] != "(":
+                result_append((OPERATOR, stack_pop()))
+            if not stack:
+                return "Error"
+            stack_pop()
+            operand_expected = False
 
-            # Resolve multiplication or division operator
-            elif infix[i] in "*/":
-                if i < len(infix) - 1 and infix[i + 1] == infix[i]:
-                    return "Error"
-                while stack and stack[-1] in "*/^#":
-                    result.append(stack.pop())
-                stack.append(infix[i])
-                i += 1
-
-            # Resolve power operator
-            elif infix[i] == "^":
-                if i < len(infix) - 1 and infix[i + 1] == infix[i]:
-                    return "Error"
-                while stack and stack[-1] == "^#":
-                    result.append(stack.pop())
-                stack.append(infix[i])
-                i += 1
-
-            # Resolve right parenthesis
-            elif infix[i] == ")":
-                while stack and stack[-1] != "(":
-                    result.append(stack.pop())
-                if not stack:
-                    return "Error"
-                else:
-                    stack.pop()
-                    i += 1
+        # Doubled multiplication, division or power sign, or unacceptable symbol
+        else:
+            return "Error"
 
     # Append all remaining operators from stack to result
     while stack:
         if stack[-1] == "(":
             return "Error"
-        result.append(stack.pop())
+        result_append((OPERATOR, stack_pop()))
 
-    return result
+    return tuple(result)
 
 
-def rpn_to_result(rpn_list):
+@functools.lru_cache(maxsize=4096)
+def compile_expression(infix):
+    """ Compile valid infix expression for repeated evaluation.
+
+    Return function of variables dictionary made by compile_rpn, names of variables used
+    in expression and whether expression contains power operator. Cached by infix string,
+    which is cheaper to hash than reverse Polish notation tuple.
+    """
+
+    rpn_list = infix_to_rpn(infix)
+    names = tuple(dict.fromkeys(value for tag, value in rpn_list if tag == VARIABLE))
+    has_power = (OPERATOR, "^") in rpn_list
+    return compile_rpn(rpn_list), names, has_power
+
+
+def compile_rpn(rpn_list):
+    """ Compile expression in reverse Polish notation into function of variables dictionary.
+
+    Assign each stack slot to a local variable of generated function, so evaluation runs
+    as straight-line code. Fold operations on integer constants other than power at compile
+    time, unless they fail, give a non-integer result, or give a result longer than
+    FOLDED_BITS_LIMIT bits.
+    Division by zero, too large powers and unknown variables are caught at runtime
+    and reported the same way as in rpn_to_result.
+    If stack would underflow or not end with single value, fall back to rpn_to_result,
+    which reports errors in order of evaluation.
+    """
+
+    depth = 0
+    for tag, token in rpn_list:
+        if tag != OPERATOR:
+            depth += 1
+        elif token == "#":
+            if not depth:
+                return functools.partial(rpn_to_result, rpn_list)
+        elif depth < 2:
+            return functools.partial(rpn_to_result, rpn_list)
+        else:
+            depth -= 1
+    if depth != 1:
+        return functools.partial(rpn_to_result, rpn_list)
+
+    lines = []
+    constants = []
+    slots = []  # value of each stack slot if known at compile time, None otherwise
+
+    def operand(index):
+        """ Return name of local variable or constant holding value of stack slot. """
+        if slots[index] is None:
+            return "s%d" % index
+        constants.append(slots[index])
+        return "c%d" % (len(constants) - 1)
+
+    for tag, token in rpn_list:
+        if tag == INTEGER:
+            slots.append(token)
+        elif tag == VARIABLE:
+            lines.append("s%d = variables[%r]" % (len(slots), token))
+            slots.append(None)
+        elif token == "#":
+            if slots[-1] is None:
+                lines.append("s%d = -1 * s%d" % (len(slots) - 1, len(slots) - 1))
+            else:
+                slots[-1] = -slots[-1]
+        else:
+            if token != "^" and slots[-2] is not None and slots[-1] is not None:
+                try:
+                    value = BINARY_OPERATIONS[token](slots[-2], slots[-1])
+                except ZeroDivisionError:
+                    value = None
+                if type(value) is int and value.bit_length() <= FOLDED_BITS_LIMIT:
+                    del slots[-2:]
+                    slots.append(value)
+                    continue
+            left = len(slots) - 2
+            operation = OPERATOR_SOURCE[token] % (operand(left), operand(left + 1))
+            lines.append("s%d = %s" % (left, operation))
+            del slots[-2:]
+            slots.append(None)
+    if slots[0] is not None:
+        lines.append("s0 = %s" % operand(0))
+
+    source = "def program(variables):\n"
+    source += "    try:\n"
+    source += "".join("        %s\n" % line for line in lines)
+    source += "    except (ZeroDivisionError, OverflowError):\n"
+    source += "        return \"Invalid expression\"\n"
+    source += "    except KeyError:\n"
+    source += "        return \"Unknown variable\"\n"
+    source += "    return s0\n"
+    namespace = {"c%d" % index: value for index, value in enumerate(constants)}
+    namespace["power"] = power
+    exec(compile(source, "<expression>", "exec"), namespace)
+    return namespace["program"]
+
+
+def rpn_to_result(rpn_list, variables):
     """ Calculate result of expression in reverse Polish notation.
 
-    Take list of integers, variables and operators in reverse Polish notation as parameter.
+    Take sequence of tagged integers, variables and operators in reverse Polish notation
+    and dictionary of variables as parameters.
     Push all integers and variables onto stack, resolve all operators accordingly.
     If unary operator encountered with empty stack, throw Invalid expression error.
     If operator encountered with less than two integers in stack, throw Invalid expression error.
-    If division by zero encountered, throw Invalid expression error.
+    If division by zero or zero to negative power encountered, throw Invalid expression error.
+    If power result is too large, throw Invalid expression error.
     If uninitialized variable name encountered, throw Unknown variable error.
     If stack not empty at the end, throw Invalid expression error.
     If empty list received as parameter, return empty string.
     """
 
-    stack = collections.deque()
-    for i in range(len(rpn_list)):
-        if isinstance(rpn_list[i], int):
-            stack.append(rpn_list[i])
-        elif rpn_list[i] == "#":
+    stack = []
+    stack_append = stack.append
+    stack_pop = stack.pop
+    for tag, token in rpn_list:
+        if tag == INTEGER:
+            stack_append(token)
+        elif tag == VARIABLE:
+            try:
+                stack_append(variables[token])
+            except KeyError:
+                return "Unknown variable"
+        elif token == "#":
             if not stack:
                 return "Invalid expression"
-            stack.append(-1 * stack.pop())
-        elif rpn_list[i] in "+-*/^":
+            stack_append(-1 * stack_pop())
+        else:
             if len(stack) < 2:
                 return "Invalid expression"
-            if rpn_list[i] == "+":
-                stack.append(stack.pop() + stack.pop())
-            elif rpn_list[i] == "*":
-                stack.append(stack.pop() * stack.pop())
-            elif rpn_list[i] == "^":
-                power = stack.pop()
-                stack.append(stack.pop() ** power)
-            elif rpn_list[i] == "-":
-                subtrahend = stack.pop()
-                stack.append(stack.pop() - subtrahend)
-            elif rpn_list[i] == "/":
-                divisor = stack.pop()
-                if divisor == 0:
-                    return "Invalid expression"
-                stack.append(stack.pop() // divisor)
-        else:
+            right = stack_pop()
             try:
-                stack.append(variables[rpn_list[i]])
-            except KeyError:
-                return "Unknown variable"
+                stack_append(BINARY_OPERATIONS[token](stack_pop(), right))
+            except (ZeroDivisionError, OverflowError):
+                return "Invalid expression"
     if len(stack) > 1:
         return "Invalid expression"
     if not len(stack):
         return ""
-    return stack.pop()
-
-
-variables = {}  # dictionary to hold variables
-line = ""
-while line != "/exit":
-    line = "".join(input().split())  # remove all whitespace from expression
-    if line:
-        if line.startswith("/"):
-            parse_command(line)
-        elif "=" in line:
-            parse_assignment(line)
-        else:
-            result = parse_expression(line)
-            print(result, end="\n" if result else "")
+    return stack_pop()
+
+
+def main():
+    """ Read expressions, assignments and commands from standard input until /exit. """
+
+    if hasattr(sys, "set_int_max_str_digits"):
+        sys.set_int_max_str_digits(0)  # allow integers of any length, as before Python 3.11
+    variables = {}  # dictionary to hold variables
+    for line in sys.stdin:
+        line = line.translate(WHITESPACE_REMOVAL)  # remove all whitespace from expression
+        if line:
+            if line.startswith("/"):
+                parse_command(line)
+                if line == "/exit":
+                    break
+            elif "=" in line:
+                parse_assignment(line, variables)
+            else:
+                result = parse_expression(line, variables)
+                print(result, end="\n" if result else "")
+
+
+if __name__ == "__main__":
+    main()